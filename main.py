@@ -1,17 +1,77 @@
 import os
 import tempfile
 import shutil
-from typing import Optional
+import subprocess
+from typing import Annotated, Optional
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel, HttpUrl
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, BeforeValidator, Field, HttpUrl, WithJsonSchema
 import yt_dlp
-import ffmpeg
+import av
+import diskcache
 import asyncio
+import collections
+import contextlib
+import copy
+import functools
+import queue
+import secrets
+import time
 from datetime import datetime
+from fractions import Fraction
 
-app = FastAPI(title="YouTube Video Trimmer API")
+app = FastAPI(title="YouTube Video Trimmer API", default_response_class=ORJSONResponse)
+
+# How long extracted video info stays cached, in seconds
+VIDEO_INFO_TTL = 600
+
+# ffmpeg binary, resolved once instead of on every run
+FFMPEG_BIN = shutil.which("ffmpeg") or "ffmpeg"
+
+# Whether ffmpeg can encode with NVENC; probed once at startup
+HAS_NVENC = False
+
+# Trimmed videos are written here
+OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "video-trimmer")
+
+# Number of trimmed videos kept on disk
+MAX_OUTPUT_FILES = 10
+
+# Most recent output paths, oldest first
+_recent_outputs = collections.deque(maxlen=MAX_OUTPUT_FILES)
+_recent_outputs_lock = asyncio.Lock()
+
+# How long to collect trims of the same video before processing them together, in seconds
+BATCH_WINDOW = 0.2
+
+# Trims waiting to be processed, keyed by video URL
+_pending_trims: dict[str, list] = {}
+_pending_trims_lock = asyncio.Lock()
+_batch_tasks = set()
+
+# Maximum number of batches downloading and trimming at the same time
+MAX_CONCURRENT_TRIMS = 4
+_trim_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRIMS)
+
+# Downloads go to per-batch directories under here
+DOWNLOAD_DIR = os.path.join(tempfile.gettempdir(), "video-trimmer-downloads")
+
+# yt-dlp's on-disk cache, which keeps the YouTube player JS across restarts
+YTDL_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ytdl-cache")
+
+# Extracted video info shared by all worker processes, expiring after VIDEO_INFO_TTL
+_info_cache = diskcache.Cache(os.path.join(tempfile.gettempdir(), "ytinfo"), size_limit=64_000_000)
+
+# Pools of long-lived yt-dlp instances, created at startup. YoutubeDL is not
+# thread-safe, so each worker thread borrows an instance for the duration of a call.
+YDL_POOL_SIZE = MAX_CONCURRENT_TRIMS
+_info_ydls: queue.Queue = queue.Queue()
+_download_ydls: queue.Queue = queue.Queue()
+
+# When set (e.g. "/internal/"), trimmed videos are served by nginx through
+# X-Accel-Redirect, which sends the file with sendfile(2) instead of Python
+X_ACCEL_REDIRECT_PREFIX = os.environ.get("X_ACCEL_REDIRECT_PREFIX")
 
 # Configure CORS with simpler settings
 app.add_middleware(
@@ -22,62 +82,228 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+def parse_time(value) -> int:
+    """Validate an HH:MM:SS string and convert it to seconds"""
+    if not isinstance(value, str):
+        raise ValueError("Invalid time format. Use HH:MM:SS")
+    try:
+        return time_to_seconds(value)
+    except ValueError:
+        raise ValueError("Invalid time format. Use HH:MM:SS")
+
+# Seconds on the Python side, but an HH:MM:SS string in the request body and its schema
+TimeString = Annotated[
+    int,
+    BeforeValidator(parse_time),
+    WithJsonSchema({'type': 'string', 'pattern': r'^\d+:\d+:\d+$', 'examples': ['00:01:30']}),
+]
+
 class VideoRequest(BaseModel):
     url: HttpUrl
-    start_time: str  # Format: HH:MM:SS
-    end_time: str    # Format: HH:MM:SS
+    # Sent as HH:MM:SS strings and parsed to seconds during validation
+    start_seconds: TimeString = Field(validation_alias='start_time')
+    end_seconds: TimeString = Field(validation_alias='end_time')
+
+@app.on_event("startup")
+def create_downloaders():
+    """Build the pools of long-lived yt-dlp instances shared by all requests"""
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+
+    info_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': True,
+        'nocheckcertificate': True,
+        'ignoreerrors': True,
+        'no_color': True,
+        'geo_bypass': True,
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['web'],
+                'player_skip': ['configs'],
+            }
+        },
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-us,en;q=0.5',
+            'Sec-Fetch-Mode': 'navigate',
+        },
+        'cachedir': YTDL_CACHE_DIR,
+    }
+
+    download_opts = {
+        # Target 360p-480p, preferring a single progressive file so no merge pass is needed
+        'format': 'b[height<=480][height>=360][ext=mp4]/bv*[height<=480][height>=360][ext=mp4]+ba[ext=m4a]/b[height<=480][height>=360]',
+        # trim_dir is set on the info dict per download, so concurrent downloads
+        # through the pooled instances land in separate directories
+        'outtmpl': os.path.join(DOWNLOAD_DIR, '%(trim_dir)s', 'video.%(ext)s'),
+        'nocheckcertificate': True,
+        'ignoreerrors': True,
+        'no_color': True,
+        'geo_bypass': True,
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['web'],
+                'player_skip': ['configs'],
+            }
+        },
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-us,en;q=0.5',
+            'Sec-Fetch-Mode': 'navigate',
+        },
+        'retries': 3,
+        'fragment_retries': 3,
+        'skip_unavailable_fragments': True,
+        'keepvideo': False,
+        'writethumbnail': False,
+        'writesubtitles': False,
+        'writeautomaticsub': False,
+        'concurrent_fragment_downloads': 16,
+        'socket_timeout': 30,
+        'extractor_retries': 3,
+        'cachedir': YTDL_CACHE_DIR,
+    }
+    if shutil.which('aria2c'):
+        # Split each download across multiple connections
+        download_opts['external_downloader'] = {'default': 'aria2c'}
+        download_opts['external_downloader_args'] = {'aria2c': ['-x', '16', '-s', '16', '-k', '1M']}
+
+    for _ in range(YDL_POOL_SIZE):
+        _info_ydls.put(yt_dlp.YoutubeDL(info_opts))
+        _download_ydls.put(yt_dlp.YoutubeDL(download_opts))
+
+@app.on_event("startup")
+def probe_ffmpeg_encoders():
+    """Check once whether ffmpeg can actually encode with h264_nvenc on this host"""
+    global HAS_NVENC
+    # Listing the encoder only means it was compiled in, so encode a single
+    # frame to confirm a usable NVIDIA GPU and driver are present. The frame must
+    # be above NVENC's minimum size or a working GPU would be rejected.
+    try:
+        result = subprocess.run(
+            [
+                FFMPEG_BIN, "-hide_banner", "-loglevel", "error",
+                "-f", "lavfi", "-i", "color=s=256x256", "-frames:v", "1",
+                "-c:v", "h264_nvenc", "-f", "null", "-",
+            ],
+            capture_output=True,
+            timeout=30,
+        )
+        HAS_NVENC = result.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        HAS_NVENC = False
+
+@app.on_event("startup")
+def sweep_output_dir():
+    """Delete all but the newest MAX_OUTPUT_FILES outputs left over from earlier runs"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    # The recent-outputs deque only lives in memory, so this is the one place
+    # files written before a restart (or by other workers) get cleaned up
+    def ctime(path):
+        # Another worker's sweep may delete files while this one runs
+        try:
+            return os.path.getctime(path)
+        except OSError:
+            return 0
+
+    paths = sorted((os.path.join(OUTPUT_DIR, name) for name in os.listdir(OUTPUT_DIR)), key=ctime)
+    for old_path in paths[:-MAX_OUTPUT_FILES]:
+        remove_file(old_path)
+    # Track the survivors so they are evicted as new outputs are written
+    _recent_outputs.extend(paths[-MAX_OUTPUT_FILES:])
+
+@app.on_event("shutdown")
+def close_downloaders():
+    """Close the yt-dlp instances"""
+    for pool in (_info_ydls, _download_ydls):
+        while not pool.empty():
+            pool.get_nowait().close()
+
+@contextlib.contextmanager
+def borrow_ydl(pool: queue.Queue):
+    """Take a yt-dlp instance from a pool for exclusive use, blocking until one is free"""
+    ydl = pool.get()
+    try:
+        yield ydl
+    finally:
+        pool.put(ydl)
+
+def process_with_downloader(info: dict, download: bool) -> dict:
+    """Run process_ie_result on a borrowed download instance"""
+    with borrow_ydl(_download_ydls) as ydl:
+        return ydl.process_ie_result(info, download=download)
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now()}
 
 @app.get("/api/video-info")
 async def get_info(url: str):
     """Get video information"""
-    return get_video_info(url)
+    info = await asyncio.to_thread(get_video_info, url)
+    return {
+        'title': info.get('title', 'Unknown Title'),
+        'duration': info.get('duration', 0),
+        'thumbnail': info.get('thumbnail', ''),
+    }
 
 @app.post("/api/trim-video")
 async def trim_video(request: VideoRequest, background_tasks: BackgroundTasks):
     """Trim video and return download link"""
-    # Validate times
-    try:
-        start_seconds = time_to_seconds(request.start_time)
-        end_seconds = time_to_seconds(request.end_time)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid time format. Use HH:MM:SS")
+    start_seconds = request.start_seconds
+    end_seconds = request.end_seconds
     
-    # Get video info to validate duration
-    video_info = get_video_info(str(request.url))
-    if end_seconds > video_info['duration']:
+    # Get video info to validate duration; reused for the download below
+    video_info = await asyncio.to_thread(get_video_info, str(request.url))
+    video_duration = video_info.get('duration', 0)
+    if end_seconds > video_duration:
         raise HTTPException(
             status_code=400,
-            detail=f"End time exceeds video duration ({video_info['duration']} seconds)"
+            detail=f"End time exceeds video duration ({video_duration} seconds)"
         )
     
     if start_seconds >= end_seconds:
         raise HTTPException(status_code=400, detail="Start time must be before end time")
     
     # Create output directory if it doesn't exist
-    output_dir = os.path.join(tempfile.gettempdir(), "video-trimmer")
-    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     
     # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"trimmed_video_{timestamp}.mp4"
-    output_path = os.path.join(output_dir, output_filename)
+    output_filename = f"trimmed_video_{secrets.token_hex(8)}.mp4"
+    output_path = os.path.join(OUTPUT_DIR, output_filename)
     
-    # Process video
-    await download_and_trim_video(str(request.url), request.start_time, request.end_time, output_path)
+    # Clean up old files (keep only the last MAX_OUTPUT_FILES files). The path is
+    # tracked before cutting, so even a cut that fails or is abandoned gets evicted.
+    async with _recent_outputs_lock:
+        evicted = _recent_outputs[0] if len(_recent_outputs) == MAX_OUTPUT_FILES else None
+        _recent_outputs.append(output_path)
+    if evicted:
+        await asyncio.to_thread(remove_file, evicted)
     
-    # Clean up old files (keep only last 10 files)
-    files = sorted(os.listdir(output_dir), key=lambda x: os.path.getctime(os.path.join(output_dir, x)))
-    if len(files) > 10:
-        for old_file in files[:-10]:
-            try:
-                os.remove(os.path.join(output_dir, old_file))
-            except:
-                pass
+    # Process video, sharing the download with other trims of the same URL
+    try:
+        await trim_batched(str(request.url), video_info, start_seconds, end_seconds, output_path)
+    except Exception:
+        # Drop whatever a failed cut left behind
+        await asyncio.to_thread(remove_file, output_path)
+        raise
+    
+    if X_ACCEL_REDIRECT_PREFIX:
+        # Let nginx send the file from the page cache without copying it through Python
+        return Response(
+            media_type="video/mp4",
+            headers={
+                "X-Accel-Redirect": X_ACCEL_REDIRECT_PREFIX + output_filename,
+                "Content-Disposition": f'attachment; filename="{output_filename}"',
+            },
+            background=background_tasks
+        )
     
     return FileResponse(
         output_path,
@@ -86,124 +312,335 @@ async def trim_video(request: VideoRequest, background_tasks: BackgroundTasks):
         background=background_tasks
     )
 
+def remove_file(path: str):
+    """Delete a file, ignoring files that are already gone"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 def time_to_seconds(time_str: str) -> int:
     """Convert HH:MM:SS to seconds"""
-    h, m, s = map(int, time_str.split(':'))
-    return h * 3600 + m * 60 + s
+    h, m, s = time_str.split(':', 2)
+    return int(h) * 3600 + int(m) * 60 + int(s)
 
 def get_video_info(url: str) -> dict:
-    """Get video information using yt-dlp"""
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': True,
-        'format': 'bv*[height=720][ext=mp4]+ba[ext=m4a]/b[height=720][ext=mp4]/b[height=720]/bv*[height<=1080][ext=mp4]+ba[ext=m4a]/b[height<=1080][ext=mp4]/b[height<=1080]',
-        'nocheckcertificate': True,
-        'ignoreerrors': True,
-        'no_color': True,
-        'geo_bypass': True,
-        'extractor_args': {
-            'youtube': {
-                'player_client': ['web'],
-                'player_skip': ['configs'],
-            }
-        },
-        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-us,en;q=0.5',
-            'Sec-Fetch-Mode': 'navigate',
-        }
-    }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    """Get the yt-dlp info dict for a video, cached for VIDEO_INFO_TTL seconds"""
+    # The TTL bucket is part of the cache key, so entries expire when it rolls over
+    return _cached_video_info(url, int(time.monotonic() // VIDEO_INFO_TTL))
+
+@functools.lru_cache(maxsize=128)
+def _cached_video_info(url: str, ttl_bucket: int) -> dict:
+    """Extract video information using yt-dlp, checking the shared disk cache first"""
+    info = _info_cache.get(url)
+    if info is not None:
+        return info
+
+    try:
+        # Skip format processing here; it runs once at download time
+        with borrow_ydl(_info_ydls) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+        if not info:
+            raise Exception("No video information returned")
+        # Drop private keys such as __post_extractor, which cannot be pickled
+        info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+        _info_cache.set(url, info, expire=VIDEO_INFO_TTL)
+        return info
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error fetching video info: {str(e)}")
+
+async def trim_batched(url: str, video_info: dict, start_seconds: int, end_seconds: int, output_path: str):
+    """Queue a trim and wait until the batch for its URL has processed it"""
+    future = asyncio.get_running_loop().create_future()
+    async with _pending_trims_lock:
+        batch = _pending_trims.get(url)
+        if batch is None:
+            batch = _pending_trims[url] = []
+            task = asyncio.create_task(run_batch(url, video_info, batch))
+            _batch_tasks.add(task)
+            task.add_done_callback(_batch_tasks.discard)
+        batch.append((start_seconds, end_seconds, output_path, future))
+    await future
+
+async def take_pending_trims(url: str) -> list:
+    """Claim the trims queued for a URL; once none are left the batch stops accepting new ones"""
+    async with _pending_trims_lock:
+        pending = _pending_trims[url]
+        if not pending:
+            del _pending_trims[url]
+            return []
+        # Empty the list in place so it keeps identifying this batch
+        batch = pending[:]
+        pending.clear()
+        return batch
+
+async def run_batch(url: str, video_info: dict, pending: list):
+    """Process every trim of a URL that arrives while its download is in flight"""
+    claimed = []
+    error = HTTPException(status_code=500, detail="Error processing video: batch was aborted")
+    try:
+        await asyncio.sleep(BATCH_WINDOW)
+        async with _trim_semaphore:
+            await download_and_trim_video(url, video_info, claimed)
+    except Exception as e:
+        error = HTTPException(status_code=500, detail=f"Error processing video: {str(e)}")
+    finally:
+        # Normally every trim is resolved and the batch unregistered by now. If something
+        # escaped (e.g. the temp dir could not be created, or the task was cancelled),
+        # fail whatever is left so neither these requests nor later ones for the URL hang.
+        async with _pending_trims_lock:
+            if _pending_trims.get(url) is pending:
+                del _pending_trims[url]
+            leftover = pending[:]
+            pending.clear()
+        for *_, future in claimed + leftover:
+            if not future.done():
+                future.set_exception(error)
+
+async def download_and_trim_video(url: str, video_info: dict, claimed: list):
+    """Download the video once and cut every trim queued for its URL from it, recording them in claimed"""
+    # Create temporary directory for downloads
+    with tempfile.TemporaryDirectory(dir=DOWNLOAD_DIR) as temp_dir:
+        error = None
         try:
-            info = ydl.extract_info(url, download=False)
-            return {
-                'title': info.get('title', 'Unknown Title'),
-                'duration': info.get('duration', 0),
-                'thumbnail': info.get('thumbnail', ''),
-            }
+            input_path, http_headers = await prepare_input(video_info, temp_dir)
         except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error fetching video info: {str(e)}")
+            error = HTTPException(status_code=500, detail=f"Error processing video: {str(e)}")
 
-async def download_and_trim_video(url: str, start_time: str, end_time: str, output_path: str):
-    """Download and trim the video using yt-dlp and ffmpeg"""
-    # Create temporary directory for downloads
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Download video
-        ydl_opts = {
-            'format': 'bv*[height<=480][height>=360][ext=mp4]+ba[ext=m4a]/b[height<=480][height>=360][ext=mp4]/b[height<=480][height>=360]',  # Target 360p-480p
-            'outtmpl': os.path.join(temp_dir, 'video.%(ext)s'),
-            'nocheckcertificate': True,
-            'ignoreerrors': True,
-            'no_color': True,
-            'geo_bypass': True,
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['web'],
-                    'player_skip': ['configs'],
-                }
-            },
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Sec-Fetch-Mode': 'navigate',
-            },
-            'postprocessors': [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': 'mp4',
-            }],
-            'merge_output_format': 'mp4',
-            'retries': 3,
-            'fragment_retries': 3,
-            'skip_unavailable_fragments': True,
-            'keepvideo': False,
-            'writethumbnail': False,
-            'writesubtitles': False,
-            'writeautomaticsub': False,
-            'postprocessor_args': [
-                '-c:v', 'copy',
-                '-c:a', 'copy',
-            ],
-            'concurrent_fragment_downloads': 3,
-            'throttledratelimit': 100000,
-            'socket_timeout': 30,
-            'extractor_retries': 3,
-        }
-        
+        # The batch stays registered until it is drained, so trims arriving while the
+        # download is in flight (or earlier cuts are running) reuse the same input
+        while True:
+            batch = await take_pending_trims(url)
+            if not batch:
+                break
+            claimed.extend(batch)
+
+            if error is None:
+                segments = [(start, end, path) for start, end, path, _ in batch]
+                errors = await cut_segments(input_path, segments, http_headers)
+            else:
+                errors = [error] * len(batch)
+
+            # Each trim succeeds or fails on its own cut
+            for (*_, future), segment_error in zip(batch, errors):
+                if future.done():
+                    continue
+                if segment_error is None:
+                    future.set_result(None)
+                elif isinstance(segment_error, HTTPException):
+                    future.set_exception(segment_error)
+                else:
+                    future.set_exception(
+                        HTTPException(status_code=500, detail=f"Error processing video: {str(segment_error)}")
+                    )
+
+async def prepare_input(video_info: dict, temp_dir: str) -> tuple:
+    """Return (input_path, http_headers): the media URL when it can be read directly, else a download in temp_dir"""
+    # Reuse the extracted info instead of running the extractor again.
+    # Processing mutates the dict, so work on a copy of the cached one.
+    selected = await asyncio.to_thread(process_with_downloader, copy.deepcopy(video_info), False)
+    if not selected:
+        raise Exception("No suitable format found")
+
+    if selected.get('url') and selected.get('protocol') in ('http', 'https'):
+        # A single progressive file is read straight from its URL, so
+        # seeking only fetches the byte ranges the trim needs
+        return selected['url'], selected.get('http_headers')
+
+    # Download video
+    selected['trim_dir'] = os.path.basename(temp_dir)
+    await asyncio.to_thread(process_with_downloader, selected, True)
+
+    # Find the downloaded file
+    video_file = next((f for f in os.listdir(temp_dir) if f.startswith('video.')), None)
+    if not video_file:
+        raise Exception("Video file not found after download")
+
+    return os.path.join(temp_dir, video_file), None
+
+async def cut_segments(input_path: str, segments: list, http_headers: Optional[dict] = None) -> list:
+    """Cut each (start_seconds, end_seconds, output_path) segment from the input.
+
+    Returns one entry per segment: None when its cut succeeded, otherwise the exception.
+    """
+    errors = [None] * len(segments)
+    reencode = []
+    for index, (start_seconds, end_seconds, output_path) in enumerate(segments):
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            # Find the downloaded file
-            video_file = next((f for f in os.listdir(temp_dir) if f.startswith('video.')), None)
-            if not video_file:
-                raise Exception("Video file not found after download")
-            
-            input_path = os.path.join(temp_dir, video_file)
-            
-            # Convert times to seconds
-            start_seconds = time_to_seconds(start_time)
-            end_seconds = time_to_seconds(end_time)
-            duration = end_seconds - start_seconds
-            
-            # Trim video using ffmpeg
-            stream = ffmpeg.input(input_path)
-            stream = ffmpeg.output(
-                stream,
-                output_path,
-                ss=start_seconds,
-                t=duration,
-                acodec='copy',
-                vcodec='copy'
+            # Trim video by remuxing in-process when the cut starts on a keyframe
+            remuxed = await asyncio.to_thread(
+                remux_segment, input_path, output_path, start_seconds, end_seconds, http_headers
             )
-            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
-            
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing video: {str(e)}")
+            errors[index] = e
+            continue
+        if not remuxed:
+            # A stream copy would start on a broken GOP, so re-encode the cut
+            reencode.append(index)
+
+    if reencode:
+        try:
+            await reencode_segments(input_path, [segments[index] for index in reencode], http_headers)
+        except Exception as e:
+            # The re-encodes share one ffmpeg run, so they fail together; remuxed cuts are unaffected
+            for index in reencode:
+                errors[index] = e
+
+    return errors
+
+def ffmpeg_headers(http_headers: Optional[dict]) -> Optional[str]:
+    """Format HTTP headers the way ffmpeg's http protocol expects them"""
+    if not http_headers:
+        return None
+    return ''.join(f"{key}: {value}\r\n" for key, value in http_headers.items())
+
+def open_input(input_path: str, http_headers: Optional[dict] = None):
+    """Open a local file or HTTP URL with PyAV"""
+    headers = ffmpeg_headers(http_headers)
+    return av.open(input_path, options={'headers': headers} if headers else None)
+
+def remux_segment(input_path: str, output_path: str, start_seconds: int, end_seconds: int,
+                  http_headers: Optional[dict] = None) -> bool:
+    """Stream-copy the segment with PyAV if it starts on a keyframe; returns False otherwise"""
+    # One open container serves both the keyframe probe and the copy, so a URL
+    # input is only opened (and its index fetched) once
+    with open_input(input_path, http_headers) as container_in:
+        seek_target = find_start_keyframe(container_in, start_seconds)
+        if seek_target is None:
+            return False
+        copy_packets(container_in, output_path, seek_target, end_seconds)
+    return True
+
+def copy_packets(container_in, output_path: str, seek_target: int, end_seconds: int):
+    """Copy the packets from seek_target up to end_seconds into a new container"""
+    with av.open(output_path, 'w') as container_out:
+        in_streams = [s for s in container_in.streams if s.type in ('video', 'audio')]
+        out_streams = {s.index: container_out.add_stream(template=s) for s in in_streams}
+
+        # Seeking lands on the keyframe found by find_start_keyframe
+        container_in.seek(seek_target)
+
+        # The clip starts at the first video keyframe; audio-only inputs start at their first packet
+        video_index = container_in.streams.video[0].index if container_in.streams.video else None
+
+        def mux(packet):
+            # Shift timestamps so the output starts at zero
+            shift = int(offset / packet.time_base)
+            packet.pts -= shift
+            packet.dts -= shift
+            packet.stream = out_streams[packet.stream.index]
+            container_out.mux(packet)
+
+        offset = None
+        # Audio demuxed before the keyframe is known; mov orders packets by file
+        # position, so audio can come out first even when the keyframe's dts is earlier
+        early_audio = []
+        finished = set()
+        for packet in container_in.demux(in_streams):
+            # Flush packets carry no data or timestamps
+            if packet.dts is None or packet.pts is None:
+                continue
+
+            if packet.pts * packet.time_base >= end_seconds:
+                finished.add(packet.stream.index)
+                if len(finished) == len(in_streams):
+                    break
+                continue
+
+            is_video = video_index is None or packet.stream.index == video_index
+            packet_time = packet.dts * packet.time_base
+            if offset is None:
+                if not is_video:
+                    early_audio.append(packet)
+                    continue
+                if not packet.is_keyframe:
+                    continue
+                offset = packet_time
+                for audio_packet in early_audio:
+                    if audio_packet.dts * audio_packet.time_base >= offset:
+                        mux(audio_packet)
+                early_audio = []
+            elif not is_video and packet_time < offset:
+                # Only audio from before the video start is dropped; video is never skipped
+                continue
+
+            mux(packet)
+
+def find_start_keyframe(container, start_seconds: int) -> Optional[int]:
+    """Return the seek position of a video keyframe within half a frame of start_seconds, or None"""
+    if not container.streams.video:
+        return int(start_seconds * av.time_base)
+
+    # Keyframes rarely fall exactly on a whole second (e.g. at 30000/1001 fps),
+    # so allow half a frame either way
+    video_stream = container.streams.video[0]
+    frame_rate = video_stream.average_rate or video_stream.guessed_rate
+    half_frame = 1 / (2 * frame_rate) if frame_rate else Fraction(1, 120)
+
+    # Seeking backward from just past the start finds a keyframe up to half a frame late too
+    seek_target = int((start_seconds + half_frame) * av.time_base)
+    container.seek(seek_target)
+    for packet in container.demux(video_stream):
+        if packet.pts is None:
+            continue
+        if packet.is_keyframe and abs(packet.pts * packet.time_base - start_seconds) <= half_frame:
+            return seek_target
+        return None
+    return None
+
+async def reencode_segments(input_path: str, segments: list, http_headers: Optional[dict] = None):
+    """Re-encode each (start_seconds, end_seconds, output_path) segment in one ffmpeg run,
+    on the GPU when NVENC is available"""
+    if HAS_NVENC:
+        try:
+            await run_ffmpeg(reencode_command(input_path, segments, http_headers, use_nvenc=True))
+            return
+        except Exception:
+            # The GPU can still fail at run time (driver, session limits); fall back to the CPU
+            pass
+    await run_ffmpeg(reencode_command(input_path, segments, http_headers, use_nvenc=False))
+
+def reencode_command(input_path: str, segments: list, http_headers: Optional[dict], use_nvenc: bool) -> list:
+    """Build the ffmpeg command that re-encodes every segment from one input"""
+    # Only errors are logged, so there is next to nothing to drain on success
+    cmd = [FFMPEG_BIN, "-hide_banner", "-y", "-loglevel", "error", "-nostats"]
+    if use_nvenc:
+        # Decode with NVDEC and keep frames on the GPU through the encoder
+        cmd += ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        video_args = ["-c:v", "h264_nvenc", "-preset", "p4", "-tune", "ll", "-rc", "vbr", "-cq", "23"]
+    else:
+        video_args = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23"]
+
+    # Seek the input to the earliest cut; each output then seeks relative to it,
+    # so the input is only demuxed and decoded once for all of them
+    base_seconds = min(start_seconds for start_seconds, _, _ in segments)
+    cmd += ["-ss", str(base_seconds)]
+    headers = ffmpeg_headers(http_headers)
+    if headers:
+        cmd += ["-headers", headers]
+    cmd += ["-i", input_path]
+
+    for start_seconds, end_seconds, output_path in segments:
+        cmd += [
+            "-ss", str(start_seconds - base_seconds), "-t", str(end_seconds - start_seconds),
+            *video_args, "-c:a", "copy", output_path,
+        ]
+    return cmd
+
+async def run_ffmpeg(cmd: list):
+    """Run an ffmpeg command, raising with the tail of its stderr on failure"""
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    # Keep only the tail of stderr for the error message
+    stderr_tail = collections.deque(maxlen=64)
+    async for line in process.stderr:
+        stderr_tail.append(line.decode(errors='replace').rstrip())
+    await process.wait()
+    if process.returncode != 0:
+        raise Exception(f"ffmpeg failed: {' '.join(stderr_tail)[-500:]}")
 
 if __name__ == "__main__":
     import uvicorn